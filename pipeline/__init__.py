@@ -0,0 +1 @@
+"""Python processing of the exported digital search facts (see pipeline/query.sql)."""
@@ -0,0 +1,155 @@
+"""Cross-category affinity from sparse user x category / domain matrices.
+
+Run from the repository root:
+
+    python -m pipeline.affinity
+
+Writes data/q2_category_affinity.csv (users shared by every pair of
+categories and their lift) and data/q3_category_domain_affinity.csv
+(users shared by a category's searchers and a domain's clickers).
+``python question2/chart-plot.py`` plots the category lift heatmap.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from pipeline.aggregate import sum_cells
+from pipeline.facts import FACTS_FILE, MissingColumnsError, labels, read_chunks
+
+
+def user_matrices(path=FACTS_FILE):
+    """CSR search counts of shape (users, categories) and (users, domains).
+
+    Only (user, column) pairs that occur are stored, so memory depends
+    on the non-zeros and not on users x columns. Domain counts only
+    include clicked searches.
+    """
+    vocabularies = {}
+    category_cells, category_counts = [], []
+    domain_cells, domain_counts = [], []
+    for chunk in read_chunks(path, vocabularies):
+        key, value = sum_cells(
+            np.column_stack([chunk["user"], chunk["category"]]),
+            np.ones((len(chunk["user"]), 1)),
+        )
+        category_cells.append(key)
+        category_counts.append(value)
+
+        clicked = chunk["click"] & (chunk["domain"] >= 0)
+        key, value = sum_cells(
+            np.column_stack([chunk["user"][clicked], chunk["domain"][clicked]]),
+            np.ones((clicked.sum(), 1)),
+        )
+        domain_cells.append(key)
+        domain_counts.append(value)
+
+    category_cells = np.concatenate(category_cells)
+    domain_cells = np.concatenate(domain_cells)
+    users, rows = np.unique(
+        np.concatenate([category_cells[:, 0], domain_cells[:, 0]]),
+        return_inverse=True,
+    )
+    rows = rows.ravel()
+
+    categories = labels(vocabularies["CATEGORY"])
+    domains = labels(vocabularies["THISDOMAIN"])
+    by_category = sparse.csr_matrix(
+        (
+            np.concatenate(category_counts)[:, 0],
+            (rows[: len(category_cells)], category_cells[:, 1]),
+        ),
+        shape=(len(users), len(categories)),
+    )
+    by_domain = sparse.csr_matrix(
+        (
+            np.concatenate(domain_counts)[:, 0],
+            (rows[len(category_cells) :], domain_cells[:, 1]),
+        ),
+        shape=(len(users), len(domains)),
+    )
+    # Duplicate (user, column) entries from different chunks are summed
+    by_category.sum_duplicates()
+    by_domain.sum_duplicates()
+    return by_category, by_domain, categories, domains
+
+
+def co_occurrence(left, right):
+    """Users shared by every left x right column pair, and their lift.
+
+    ``lift = shared * users / (users_left * users_right)`` is 1 when
+    searching one column tells nothing about the other.
+    """
+    left = (left > 0).astype(np.int64)
+    right = (right > 0).astype(np.int64)
+    shared = (left.T @ right).tocoo()
+
+    left_users = np.asarray(left.sum(axis=0)).ravel()
+    right_users = np.asarray(right.sum(axis=0)).ravel()
+    lift = (
+        shared.data * left.shape[0] / (left_users[shared.row] * right_users[shared.col])
+    )
+    return shared.row, shared.col, shared.data, lift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facts", default=FACTS_FILE)
+    parser.add_argument(
+        "--top-domains", type=int, default=10, help="Domains kept per category"
+    )
+    args = parser.parse_args()
+
+    try:
+        by_category, by_domain, categories, domains = user_matrices(args.facts)
+    except FileNotFoundError:
+        print(
+            f"Error: The file '{args.facts}' was not found. Please save the results of pipeline/query.sql to this file."
+        )
+        exit()
+    except MissingColumnsError as error:
+        print(f"Error: {error}")
+        exit()
+
+    row, col, shared, lift = co_occurrence(by_category, by_category)
+    df_categories = pd.DataFrame(
+        {
+            "CATEGORY_A": categories[row],
+            "CATEGORY_B": categories[col],
+            "SHARED_USERS": shared,
+            "LIFT": lift,
+        }
+    ).sort_values(["CATEGORY_A", "CATEGORY_B"])
+
+    row, col, shared, lift = co_occurrence(by_category, by_domain)
+    df_domains = pd.DataFrame(
+        {
+            "CATEGORY": categories[row],
+            "THISDOMAIN": domains[col],
+            "SHARED_USERS": shared,
+            "LIFT": lift,
+        }
+    )
+    df_domains = (
+        df_domains.sort_values(["CATEGORY", "SHARED_USERS"], ascending=[True, False])
+        .groupby("CATEGORY")
+        .head(args.top_domains)
+    )
+
+    df_categories.to_csv("./data/q2_category_affinity.csv", index=False)
+    df_domains.to_csv("./data/q3_category_domain_affinity.csv", index=False)
+
+    print(
+        f"Built {by_category.shape[0]:,} users x {len(categories)} categories "
+        f"({by_category.nnz:,} non-zeros) and x {len(domains):,} domains "
+        f"({by_domain.nnz:,} non-zeros)"
+    )
+    print(
+        "Successfully generated q2_category_affinity.csv and q3_category_domain_affinity.csv"
+    )
+
+
+if __name__ == "__main__":
+    main()
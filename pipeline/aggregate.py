@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+
+from pipeline.bitmaps import build_store
+from pipeline.facts import FACTS_FILE, labels, read_chunks
+
+# ----------------------------------------------------------------------
+# ON-DISK AGGREGATE CACHE
+# ----------------------------------------------------------------------
+
+CACHE_FILE = "./data/cache/aggregates.npz"
+CACHE_VERSION = 3  # bump when build_aggregates changes its output
+
+
+def sum_cells(key, values):
+    """Sum the rows of ``values`` that share the same row of ``key``."""
+    cells, inverse = np.unique(key, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    sums = np.column_stack(
+        [np.bincount(inverse, weights=column) for column in values.T]
+    )
+    return cells.astype(np.int64), sums.astype(np.int64)
+
+
+def build_aggregates(path=FACTS_FILE):
+    """Aggregate the facts extract into dense category series.
+
+    Returns a dict with the category labels, the (consecutive) day
+    numbers and ``daily_searches`` / ``daily_clicks`` of shape
+    (days, categories) and ``hourly_searches`` of shape
+    (days * 24, categories). Per query counts are kept sparse as
+    ``query_cells`` (day index, query code) and ``query_searches``.
+    The ANONIDs of every category x day are kept as compressed bitmaps
+    under the ``users_`` prefix (bitmap ``category * days + day index``,
+    see pipeline/bitmaps.py).
+    """
+    vocabularies = {}
+    keys, counts, query_keys, query_counts, user_keys = [], [], [], [], []
+    for chunk in read_chunks(path, vocabularies):
+        key = np.column_stack([chunk["day"], chunk["hour"], chunk["category"]])
+        key, value = sum_cells(
+            key, np.column_stack([np.ones(len(key)), chunk["click"]])
+        )
+        keys.append(key)
+        counts.append(value)
+
+        key = np.column_stack([chunk["day"], chunk["query"]])
+        key, value = sum_cells(key, np.ones((len(key), 1)))
+        query_keys.append(key)
+        query_counts.append(value)
+
+        user_keys.append(
+            np.unique(
+                np.column_stack([chunk["category"], chunk["day"], chunk["user"]]),
+                axis=0,
+            )
+        )
+
+    # One (day, hour, category) cell with its searches and clicks
+    key, values = sum_cells(np.concatenate(keys), np.concatenate(counts))
+    categories = labels(vocabularies["CATEGORY"])
+
+    first_day = key[:, 0].min()
+    days = np.arange(first_day, key[:, 0].max() + 1)
+
+    hourly_searches = np.zeros((len(days) * 24, len(categories)), dtype=np.int64)
+    hourly_clicks = np.zeros_like(hourly_searches)
+    row = (key[:, 0] - first_day) * 24 + key[:, 1]
+    hourly_searches[row, key[:, 2]] = values[:, 0]
+    hourly_clicks[row, key[:, 2]] = values[:, 1]
+
+    query_cells, query_searches = sum_cells(
+        np.concatenate(query_keys), np.concatenate(query_counts)
+    )
+    query_cells[:, 0] -= first_day
+
+    # Unique (category, day, ANONID) rows come out sorted by bitmap then id
+    users = np.unique(np.concatenate(user_keys).astype(np.int64), axis=0)
+    owner = users[:, 0] * len(days) + users[:, 1] - first_day
+    user_store = build_store(owner, users[:, 2], len(categories) * len(days))
+
+    return {
+        "categories": categories.astype(str),
+        "days": days,
+        "hourly_searches": hourly_searches,
+        "daily_searches": hourly_searches.reshape(len(days), 24, -1).sum(axis=1),
+        "daily_clicks": hourly_clicks.reshape(len(days), 24, -1).sum(axis=1),
+        "queries": labels(vocabularies["QUERY"]).astype(str),
+        "query_cells": query_cells,
+        "query_searches": query_searches[:, 0],
+        **{f"users_{name}": array for name, array in user_store.items()},
+    }
+
+
+def load_aggregates(path=FACTS_FILE, cache=CACHE_FILE):
+    """Return the aggregates, rebuilding the cache when the extract changed."""
+    modified = os.path.getmtime(path)
+    if os.path.exists(cache):
+        with np.load(cache) as cached:
+            if (
+                "version" in cached.files
+                and cached["version"] == CACHE_VERSION
+                and cached["source_mtime"] == modified
+            ):
+                return {name: cached[name] for name in cached.files}
+
+    aggregates = build_aggregates(path)
+    aggregates["source_mtime"] = np.float64(modified)
+    aggregates["version"] = np.int64(CACHE_VERSION)
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    np.savez_compressed(cache, **aggregates)
+    return aggregates
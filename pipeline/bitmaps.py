@@ -0,0 +1,241 @@
+from functools import reduce
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# ROARING-STYLE COMPRESSED BITMAPS OF ANONIDS
+# ----------------------------------------------------------------------
+# An id is split into its high 16 bits (the container key) and its low
+# 16 bits. A container holds the low bits either as a sorted uint16
+# array (up to ARRAY_LIMIT ids) or as a 2**16 bit bitmap (1024 uint64
+# words), whichever is smaller.
+
+ARRAY_LIMIT = 4096
+WORDS = 1024
+
+
+def to_words(container):
+    """Bitmap form (1024 uint64 words) of a container."""
+    if container.dtype == np.uint64:
+        return container
+    bits = np.zeros(2**16, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view("<u8").astype(np.uint64)
+
+
+def unpack_words(words):
+    """All low bits set in a bitmap container, as a uint16 array."""
+    bits = np.unpackbits(words.astype("<u8").view(np.uint8), bitorder="little")
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def from_words(words):
+    """Smallest container for a bitmap (1024 uint64 words)."""
+    if np.bitwise_count(words).sum() > ARRAY_LIMIT:
+        return words
+    return unpack_words(words)
+
+
+def cardinality(container):
+    if container.dtype == np.uint64:
+        return int(np.bitwise_count(container).sum())
+    return len(container)
+
+
+def contains(words, values):
+    """Mask of the uint16 ``values`` that are set in ``words``."""
+    bit = (words[values >> 6] >> (values & 63).astype(np.uint64)) & np.uint64(1)
+    return bit.astype(bool)
+
+
+def and_containers(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return np.intersect1d(a, b, assume_unique=True)
+    if a.dtype == np.uint16:
+        a, b = b, a
+    if b.dtype == np.uint16:
+        return b[contains(a, b)]
+    return from_words(a & b)
+
+
+def or_containers(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        union = np.union1d(a, b)
+        return union if len(union) <= ARRAY_LIMIT else to_words(union)
+    return to_words(a) | to_words(b)
+
+
+def or_many_containers(containers):
+    """Union of any number of containers (of the same key) in one pass."""
+    if len(containers) == 1:
+        return containers[0]
+    arrays = [c for c in containers if c.dtype == np.uint16]
+    words = [c for c in containers if c.dtype == np.uint64]
+    if not words:
+        union = np.unique(np.concatenate(arrays))
+        return union if len(union) <= ARRAY_LIMIT else to_words(union)
+    union = np.bitwise_or.reduce(words)
+    if arrays:
+        union |= to_words(np.concatenate(arrays))
+    return union
+
+
+def andnot_containers(a, b):
+    if a.dtype == np.uint16:
+        if b.dtype == np.uint16:
+            return np.setdiff1d(a, b, assume_unique=True)
+        return a[~contains(b, a)]
+    return from_words(a & ~to_words(b))
+
+
+class RoaringBitmap:
+    """Compressed set of 32-bit ids with exact set algebra.
+
+    ``keys`` is the sorted uint16 array of container keys and
+    ``containers`` the matching list of uint16 arrays or uint64 words.
+    """
+
+    def __init__(self, keys=None, containers=None):
+        self.keys = np.empty(0, dtype=np.uint16) if keys is None else keys
+        self.containers = [] if containers is None else containers
+
+    @classmethod
+    def from_ids(cls, ids):
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        if not len(ids):
+            return cls()
+        if ids[0] < 0 or ids[-1] >= 2**32:
+            raise ValueError("RoaringBitmap only holds ids in [0, 2**32)")
+        high = ids >> 16
+        keys, starts = np.unique(high, return_index=True)
+        low = (ids & 0xFFFF).astype(np.uint16)
+        containers = [
+            part if len(part) <= ARRAY_LIMIT else to_words(part)
+            for part in np.split(low, starts[1:])
+        ]
+        return cls(keys.astype(np.uint16), containers)
+
+    @classmethod
+    def union(cls, bitmaps):
+        """Union of many bitmaps, merging the containers of every key once."""
+        bitmaps = list(bitmaps)
+        keys = np.concatenate([np.empty(0, np.uint16)] + [b.keys for b in bitmaps])
+        if not len(keys):
+            return cls()
+        containers = [container for b in bitmaps for container in b.containers]
+        order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        merged = [
+            or_many_containers([containers[i] for i in group])
+            for group in np.split(order, starts[1:])
+        ]
+        return cls(unique_keys, merged)
+
+    @classmethod
+    def intersection(cls, bitmaps):
+        return reduce(cls.__and__, bitmaps)
+
+    def __len__(self):
+        return sum(cardinality(container) for container in self.containers)
+
+    def __and__(self, other):
+        _, mine, theirs = np.intersect1d(
+            self.keys, other.keys, assume_unique=True, return_indices=True
+        )
+        pairs = [
+            (self.keys[i], and_containers(self.containers[i], other.containers[j]))
+            for i, j in zip(mine, theirs)
+        ]
+        return self._from_pairs(pairs)
+
+    def __or__(self, other):
+        position = {key: i for i, key in enumerate(other.keys)}
+        pairs = []
+        for key, container in zip(self.keys, self.containers):
+            j = position.pop(key, None)
+            if j is not None:
+                container = or_containers(container, other.containers[j])
+            pairs.append((key, container))
+        pairs.extend((other.keys[j], other.containers[j]) for j in position.values())
+        pairs.sort(key=lambda pair: pair[0])
+        return self._from_pairs(pairs)
+
+    def __sub__(self, other):
+        position = {key: j for j, key in enumerate(other.keys)}
+        pairs = []
+        for key, container in zip(self.keys, self.containers):
+            j = position.get(key)
+            if j is not None:
+                container = andnot_containers(container, other.containers[j])
+            pairs.append((key, container))
+        return self._from_pairs(pairs)
+
+    def to_array(self):
+        """The ids as a sorted int64 array."""
+        parts = [
+            (np.int64(key) << 16)
+            | (container if container.dtype == np.uint16 else unpack_words(container))
+            for key, container in zip(self.keys, self.containers)
+        ]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def _from_pairs(cls, pairs):
+        pairs = [(key, container) for key, container in pairs if cardinality(container)]
+        keys = np.array([key for key, _ in pairs], dtype=np.uint16)
+        return cls(keys, [container for _, container in pairs])
+
+
+# ----------------------------------------------------------------------
+# FLAT STORAGE OF MANY BITMAPS (for the aggregate cache)
+# ----------------------------------------------------------------------
+
+
+def build_store(owner, ids, n_bitmaps):
+    """Pack one bitmap per ``owner`` value into flat numpy arrays.
+
+    ``owner`` and ``ids`` are parallel arrays of unique (bitmap, id)
+    pairs sorted by bitmap then id. Bitmap containers are stored as
+    4096 uint16 values (the uint64 words viewed as uint16).
+    """
+    high = ids >> 16
+    low = (ids & 0xFFFF).astype(np.uint16)
+    boundary = np.r_[True, (owner[1:] != owner[:-1]) | (high[1:] != high[:-1])]
+    starts = np.flatnonzero(boundary)
+    card = np.diff(np.r_[starts, len(ids)])
+    is_words = card > ARRAY_LIMIT
+
+    sizes = np.where(is_words, 4 * WORDS, card)
+    offsets = np.r_[0, np.cumsum(sizes)]
+    payload = np.zeros(offsets[-1], dtype=np.uint16)
+
+    # Array containers copy their low bits, bitmap containers are rare
+    container = np.repeat(np.arange(len(starts)), card)
+    is_array_row = ~is_words[container]
+    position = offsets[container] + np.arange(len(ids)) - starts[container]
+    payload[position[is_array_row]] = low[is_array_row]
+    for c in np.flatnonzero(is_words):
+        words = to_words(low[starts[c] : starts[c] + card[c]])
+        payload[offsets[c] : offsets[c + 1]] = words.view(np.uint16)
+
+    return {
+        "bitmap_offsets": np.searchsorted(owner[starts], np.arange(n_bitmaps + 1)),
+        "container_keys": high[starts].astype(np.uint16),
+        "container_is_words": is_words,
+        "container_offsets": offsets,
+        "payload": payload,
+    }
+
+
+def load_bitmap(store, index):
+    """Rebuild bitmap ``index`` of a store made by ``build_store``."""
+    first, last = store["bitmap_offsets"][index : index + 2]
+    containers = []
+    for c in range(first, last):
+        part = store["payload"][
+            store["container_offsets"][c] : store["container_offsets"][c + 1]
+        ]
+        containers.append(
+            part.view(np.uint64) if store["container_is_words"][c] else part
+        )
+    return RoaringBitmap(store["container_keys"][first:last], containers)
@@ -0,0 +1,131 @@
+"""Click distribution and CTR by clicked result position (ItemRank).
+
+Run from the repository root:
+
+    python -m pipeline.click_position --max-rank 10
+
+Writes data/q2_click_position.csv with, for every category x hour x
+weekday and for the Q2 grouping sets (category, category x hour,
+category x weekday), the clicks and CTR at each result position.
+Positions above ``--max-rank`` are grouped into one ``<max-rank + 1>+``
+bucket and clicks without a (NULL or 0) ITEMRANK into ``unknown``, so
+TOTAL_CLICKS matches the CLICK based Q2 totals.
+``python question2/click-position-plot.py`` plots the curves.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from pipeline.facts import (
+    FACTS_FILE,
+    WEEKDAY_ORDER,
+    MissingColumnsError,
+    labels,
+    read_chunks,
+)
+
+HOURS = 24
+WEEKDAYS = 7
+
+
+def rank_counts(path=FACTS_FILE, max_rank=10):
+    """Counts of shape (categories, hours, weekdays, max_rank + 3).
+
+    Position 0 holds the searches without a click, positions 1 to
+    ``max_rank`` the clicks at that result position, then the clicks
+    further down and last the clicks with an unknown position. Every
+    chunk is counted with a single ``np.bincount`` over one combined
+    integer key.
+    """
+    buckets = max_rank + 3
+    cell = HOURS * WEEKDAYS * buckets  # keys per category
+    vocabularies = {}
+    counts = np.zeros(0, dtype=np.int64)
+    for chunk in read_chunks(path, vocabularies):
+        weekday = (chunk["day"].astype(np.int64) + 3) % WEEKDAYS
+        rank = np.where(
+            chunk["rank"] > 0, np.minimum(chunk["rank"], max_rank + 1), max_rank + 2
+        )
+        rank = np.where(chunk["click"], rank, 0)
+        key = (
+            (chunk["category"].astype(np.int64) * HOURS + chunk["hour"]) * WEEKDAYS
+            + weekday
+        ) * buckets + rank
+
+        # Category is the outermost part of the key, so new categories
+        # only append to the end of the running counts
+        chunk_counts = np.bincount(key, minlength=len(counts))
+        chunk_counts[: len(counts)] += counts
+        counts = chunk_counts
+
+    categories = labels(vocabularies["CATEGORY"])
+    counts = np.pad(counts, (0, len(categories) * cell - len(counts)))
+    return counts.reshape(len(categories), HOURS, WEEKDAYS, buckets), categories
+
+
+def to_frame(counts, categories, hour=False, weekday=False):
+    """One row per category (x hour / weekday) x clicked position."""
+    searches = counts.sum(axis=-1, keepdims=True)
+    clicks = searches - counts[..., :1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = counts[..., 1:] * 100 / searches
+        share = counts[..., 1:] * 100 / clicks
+
+    index = np.indices(counts[..., 1:].shape).reshape(counts.ndim, -1)
+    max_rank = counts.shape[-1] - 3
+    rank_labels = [str(r) for r in range(1, max_rank + 1)]
+    rank_labels += [f"{max_rank + 1}+", "unknown"]
+    df = pd.DataFrame(
+        {
+            "CATEGORY": categories[index[0]],
+            "hour": [f"{h:02d}" for h in index[1]] if hour else "",
+            "weekday": np.array(WEEKDAY_ORDER)[index[-2]] if weekday else "",
+            "ITEM_RANK": np.array(rank_labels)[index[-1]],
+            "RANK_CLICKS": counts[..., 1:].ravel(),
+            "TOTAL_SEARCHES": np.broadcast_to(searches, ctr.shape).ravel(),
+            "TOTAL_CLICKS": np.broadcast_to(clicks, ctr.shape).ravel(),
+            "CTR_PERCENTAGE": ctr.ravel(),
+            "CLICK_SHARE_PERCENTAGE": share.ravel(),
+        }
+    )
+    return df[df["TOTAL_SEARCHES"] > 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facts", default=FACTS_FILE)
+    parser.add_argument(
+        "--max-rank", type=int, default=10, help="Last result position on its own"
+    )
+    args = parser.parse_args()
+
+    try:
+        counts, categories = rank_counts(args.facts, args.max_rank)
+    except FileNotFoundError:
+        print(
+            f"Error: The file '{args.facts}' was not found. Please save the results of pipeline/query.sql to this file."
+        )
+        exit()
+    except MissingColumnsError as error:
+        print(f"Error: {error}")
+        exit()
+
+    # The Q2 grouping sets are sums over the full category x hour x weekday cube
+    df = pd.concat(
+        [
+            to_frame(counts.sum(axis=(1, 2)), categories),
+            to_frame(counts.sum(axis=2), categories, hour=True),
+            to_frame(counts.sum(axis=1), categories, weekday=True),
+            to_frame(counts, categories, hour=True, weekday=True),
+        ],
+        ignore_index=True,
+    )
+    df.to_csv("./data/q2_click_position.csv", index=False)
+
+    print("Successfully generated q2_click_position.csv")
+
+
+if __name__ == "__main__":
+    main()
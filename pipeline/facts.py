@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------------------------------------------------
+# FACTS EXTRACT (see pipeline/query.sql)
+# ----------------------------------------------------------------------
+
+FACTS_FILE = "./data/digital_facts.csv"
+CHUNK_SIZE = 500_000
+
+WEEKDAY_ORDER = [
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+]
+MONTH_NAMES = {3: "march", 4: "april", 5: "may"}
+COLUMNS = [
+    "ANONID",
+    "QUERY",
+    "CATEGORY",
+    "EVENT_DATE_STRING",
+    "hour",
+    "CLICK",
+    "ITEMRANK",
+    "THISDOMAIN",
+]
+
+
+class MissingColumnsError(ValueError):
+    """The facts extract was saved from an older pipeline/query.sql."""
+
+
+def encode(values, vocabulary):
+    """Map labels to integer codes, growing the vocabulary with unseen labels.
+
+    Missing values are encoded as -1.
+    """
+    codes, uniques = pd.factorize(values)
+    lookup = np.array(
+        [vocabulary.setdefault(label, len(vocabulary)) for label in uniques],
+        dtype=np.int32,
+    )
+    out = np.full(len(codes), -1, dtype=np.int32)
+    out[codes >= 0] = lookup[codes[codes >= 0]]
+    return out
+
+
+def labels(vocabulary):
+    """Return the labels of a vocabulary ordered by their code."""
+    return np.array(sorted(vocabulary, key=vocabulary.get), dtype=object)
+
+
+def read_chunks(path=FACTS_FILE, vocabularies=None, chunksize=CHUNK_SIZE):
+    """Stream the facts extract as dicts of integer-encoded numpy arrays.
+
+    Queries, categories and domains are encoded against ``vocabularies`` (a dict
+    of dicts that is filled in while reading), days are stored as days
+    since 1970-01-01 so that they sort chronologically. Raises
+    ``MissingColumnsError`` when the extract lacks one of ``COLUMNS``.
+    """
+    header = pd.read_csv(path, nrows=0).columns.str.strip()
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise MissingColumnsError(
+            f"The file '{path}' has no {', '.join(missing)} column(s). "
+            "Please re-export it with the current pipeline/query.sql."
+        )
+
+    if vocabularies is None:
+        vocabularies = {}
+    vocabularies.setdefault("QUERY", {})
+    vocabularies.setdefault("CATEGORY", {})
+    vocabularies.setdefault("THISDOMAIN", {})
+
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str):
+        chunk.columns = chunk.columns.str.strip()
+        click = chunk["CLICK"].str.strip().str.lower().isin(["true", "1", "t"])
+        day = pd.to_datetime(chunk["EVENT_DATE_STRING"].str.strip())
+        # Clicked result position, 0 when not clicked or the position is unknown
+        rank = pd.to_numeric(chunk["ITEMRANK"]).fillna(0).where(click, 0)
+        yield {
+            "user": pd.to_numeric(chunk["ANONID"]).to_numpy(np.int64),
+            "query": encode(chunk["QUERY"].str.strip(), vocabularies["QUERY"]),
+            "category": encode(chunk["CATEGORY"].str.strip(), vocabularies["CATEGORY"]),
+            "day": day.to_numpy("datetime64[D]").astype(np.int32),
+            "hour": pd.to_numeric(chunk["hour"]).to_numpy(np.int8),
+            "click": click.to_numpy(),
+            "rank": rank.to_numpy(np.int32),
+            "domain": encode(
+                chunk["THISDOMAIN"].str.strip(), vocabularies["THISDOMAIN"]
+            ),
+        }
+
+
+def day_calendar(days):
+    """Calendar attributes (as used by TIMEDIM) for encoded day numbers."""
+    dates = pd.to_datetime(np.asarray(days, dtype="datetime64[D]"))
+    return pd.DataFrame(
+        {
+            "EVENT_DATE_STRING": dates.strftime("%Y-%m-%d"),
+            "SALES_MONTH": dates.month.map(MONTH_NAMES),
+            "calender week": dates.isocalendar().week.to_numpy(),
+            # 1970-01-01 was a Thursday
+            "weekday": (np.asarray(days) + 3) % 7,
+        }
+    )
@@ -0,0 +1,352 @@
+"""Fast approximate Q1-Q4 datasets from a stratified sample of the facts.
+
+Run from the repository root:
+
+    python -m pipeline.preview --per-stratum 200 --user-rate 0.05
+
+The datasets are written to data/preview/ with the same columns as the
+warehouse results plus ``<METRIC>_CI_LOW`` / ``<METRIC>_CI_HIGH``
+columns for the estimated metrics, and can be plotted with
+``python questionN/chart-plot.py --preview``. The stratum sizes are
+counted exactly, so the Q1 and Q4 search counts (whole category x day
+strata) are exact and have no interval.
+
+Drawing the sample reads the whole extract once. The sample is kept in
+data/cache/preview_sample.npz, so later previews with the same or a
+smaller ``--per-stratum`` / ``--user-rate`` do not read the extract
+again until it changes (or ``--resample`` is passed).
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from pipeline.facts import (
+    FACTS_FILE,
+    WEEKDAY_ORDER,
+    MissingColumnsError,
+    day_calendar,
+    labels,
+    read_chunks,
+)
+from pipeline.sampling import (
+    StratifiedReservoir,
+    UserSample,
+    confidence_interval,
+    estimate_distinct,
+    estimate_ratio,
+    estimate_total,
+)
+
+PREVIEW_DIR = "./data/preview"
+SAMPLE_CACHE = "./data/cache/preview_sample.npz"
+
+
+def with_interval(df, column, estimate, variance, upper=np.inf):
+    """Add a metric column and its confidence interval columns."""
+    low, high = confidence_interval(estimate, variance, upper=upper)
+    df[column] = estimate
+    df[f"{column}_CI_LOW"] = low
+    df[f"{column}_CI_HIGH"] = high
+    return df
+
+
+def group_codes(*codes):
+    """Combine several code arrays into one dense group index."""
+    groups, index = np.unique(np.column_stack(codes), axis=0, return_inverse=True)
+    return groups, index.ravel()
+
+
+# ----------------------------------------------------------------------
+# Q1: ROLLUP(month, calender week)
+# ----------------------------------------------------------------------
+
+
+def q1_rollup(rows, population, sample_size):
+    calendar = day_calendar(rows["day"])
+    month = calendar["SALES_MONTH"].to_numpy()
+    week = calendar["calender week"].to_numpy()
+    ones = np.ones(len(month))
+    month_codes = pd.Categorical(month, categories=["march", "april", "may"]).codes
+
+    frames = []
+    for level in ["week", "month", "total"]:
+        if level == "week":
+            groups, group = group_codes(month_codes, week)
+        elif level == "month":
+            groups, group = group_codes(month_codes)
+        else:
+            groups, group = np.zeros((1, 1), dtype=int), np.zeros(len(month), int)
+
+        total, _ = estimate_total(
+            rows["stratum"], group, ones, len(groups), population, sample_size
+        )
+        df = pd.DataFrame(
+            {
+                "SALES_MONTH": (
+                    np.array(["march", "april", "may"])[groups[:, 0]]
+                    if level != "total"
+                    else [""]
+                ),
+                "calender week": (
+                    [f"{w:02d}" for w in groups[:, 1]] if level == "week" else ""
+                ),
+            }
+        )
+        # Every group is a union of whole strata, so the count is exact
+        df["DIGITAL_SEARCH_COUNT"] = np.rint(total).astype(np.int64)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ----------------------------------------------------------------------
+# Q2: GROUPING SETS ((CATEGORY), (CATEGORY, hour), (CATEGORY, weekday))
+# ----------------------------------------------------------------------
+
+
+def q2_grouping_sets(rows, population, sample_size, categories):
+    weekday = (rows["day"] + 3) % 7
+    click = rows["click"].astype(np.float64)
+    ones = np.ones(len(click))
+
+    frames = []
+    for detail in [None, "hour", "weekday"]:
+        if detail is None:
+            groups, group = group_codes(rows["category"])
+        elif detail == "hour":
+            groups, group = group_codes(rows["category"], rows["hour"])
+        else:
+            groups, group = group_codes(rows["category"], weekday)
+
+        args = (rows["stratum"], group)
+        sizes = (len(groups), population, sample_size)
+        searches, searches_var = estimate_total(*args, ones, *sizes)
+        clicks, clicks_var = estimate_total(*args, click, *sizes)
+        ctr, ctr_var = estimate_ratio(*args, click, *sizes)
+
+        df = pd.DataFrame(
+            {
+                "CATEGORY": categories[groups[:, 0]],
+                "hour": [f"{h:02d}" for h in groups[:, 1]] if detail == "hour" else "",
+                "weekday": (
+                    np.array(WEEKDAY_ORDER)[groups[:, 1]] if detail == "weekday" else ""
+                ),
+            }
+        )
+        with_interval(df, "TOTAL_SEARCHES", searches, searches_var)
+        with_interval(df, "TOTAL_CLICKS", clicks, clicks_var)
+        with_interval(df, "CTR_PERCENTAGE", ctr * 100, ctr_var * 100**2, upper=100)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True).sort_values(
+        ["CATEGORY", "hour", "weekday"]
+    )
+
+
+# ----------------------------------------------------------------------
+# Q3: TOP 5 CLICKED DOMAINS PER CATEGORY
+# ----------------------------------------------------------------------
+
+
+def q3_top_domains(rows, population, sample_size, categories, domains):
+    clicked = rows["click"] & (rows["domain"] >= 0)
+    groups, group = group_codes(rows["category"], rows["domain"])
+    group = np.where(clicked, group, -1)
+
+    clicks, variance = estimate_total(
+        rows["stratum"],
+        group,
+        np.ones(len(group)),
+        len(groups),
+        population,
+        sample_size,
+    )
+    df = pd.DataFrame(
+        {
+            "CATEGORY": categories[groups[:, 0]],
+            "THISDOMAIN": domains[np.maximum(groups[:, 1], 0)],
+        }
+    )
+    df = with_interval(df, "DOMAIN_CLICK_COUNT", clicks, variance)
+    df = df[df["DOMAIN_CLICK_COUNT"] > 0]
+    df["DOMAIN_RANK_WITHIN_CATEGORY"] = (
+        df.groupby("CATEGORY")["DOMAIN_CLICK_COUNT"]
+        .rank(method="min", ascending=False)
+        .astype(int)
+    )
+    df = df[df["DOMAIN_RANK_WITHIN_CATEGORY"] <= 5]
+    return df.sort_values(["CATEGORY", "DOMAIN_RANK_WITHIN_CATEGORY"])
+
+
+# ----------------------------------------------------------------------
+# Q4: DAILY SEARCHES AND UNIQUE USERS
+# ----------------------------------------------------------------------
+
+
+def q4_daily_trend(rows, population, sample_size, users):
+    days, group = np.unique(rows["day"], return_inverse=True)
+    searches, _ = estimate_total(
+        rows["stratum"],
+        group.ravel(),
+        np.ones(len(group)),
+        len(days),
+        population,
+        sample_size,
+    )
+
+    day_users = np.unique(users.triples[:, 1:], axis=0)
+    user_group = np.searchsorted(days, day_users[:, 0])
+    user_group = np.where(
+        days[np.minimum(user_group, len(days) - 1)] == day_users[:, 0], user_group, -1
+    )
+    unique_users, unique_var = estimate_distinct(user_group, len(days), users.rate)
+
+    df = pd.DataFrame({"EVENT_DATE_STRING": day_calendar(days)["EVENT_DATE_STRING"]})
+    # Every day is a union of whole strata, so the count is exact
+    df["TOTAL_DAILY_DIGITAL_SEARCHES"] = np.rint(searches).astype(np.int64)
+    with_interval(df, "UNIQUE_DAILY_DIGITAL_USERS", unique_users, unique_var)
+    return df
+
+
+# ----------------------------------------------------------------------
+# SAMPLE CACHE
+# ----------------------------------------------------------------------
+
+
+def draw_sample(path, per_stratum, user_rate, seed=None):
+    """Stream the extract once into a row reservoir and a user sample."""
+    vocabularies = {}
+    reservoir = StratifiedReservoir(per_stratum, seed=seed)
+    users = UserSample(user_rate)
+    for chunk in read_chunks(path, vocabularies):
+        reservoir.update(chunk)
+        users.update(chunk)
+    categories = labels(vocabularies["CATEGORY"]).astype(str)
+    domains = labels(vocabularies["THISDOMAIN"]).astype(str)
+    return reservoir, users, categories, domains
+
+
+def load_sample(path, per_stratum, user_rate, seed=None, cache=SAMPLE_CACHE):
+    """Return the samples, reusing the cached ones when they are large enough.
+
+    The cache is used when the extract has not changed, it was drawn with
+    the requested seed (any seed if none is requested) and it has at
+    least ``per_stratum`` rows per stratum and ``user_rate``. It is then
+    shrunk to the requested size. The last value tells whether the
+    cache was used.
+    """
+    modified = os.path.getmtime(path)
+    if os.path.exists(cache):
+        with np.load(cache) as cached:
+            if (
+                cached["source_mtime"] == modified
+                and (seed is None or cached["seed"] == seed)
+                and cached["per_stratum"] >= per_stratum
+                and cached["user_rate"] >= user_rate
+            ):
+                reservoir = StratifiedReservoir(int(cached["per_stratum"]))
+                reservoir.rows = {
+                    name[len("rows_") :]: cached[name]
+                    for name in cached.files
+                    if name.startswith("rows_")
+                }
+                reservoir.strata = cached["strata"]
+                reservoir.population = cached["population"]
+                reservoir.shrink(per_stratum)
+
+                users = UserSample(float(cached["user_rate"]))
+                users.triples = cached["user_triples"]
+                users.shrink(user_rate)
+                return (
+                    reservoir,
+                    users,
+                    cached["categories"],
+                    cached["domains"],
+                    True,
+                )
+
+    reservoir, users, categories, domains = draw_sample(
+        path, per_stratum, user_rate, seed
+    )
+    os.makedirs(os.path.dirname(cache), exist_ok=True)
+    np.savez_compressed(
+        cache,
+        **{f"rows_{name}": values for name, values in reservoir.rows.items()},
+        strata=reservoir.strata,
+        population=reservoir.population,
+        user_triples=users.triples,
+        categories=categories,
+        domains=domains,
+        source_mtime=np.float64(modified),
+        seed=np.int64(-1 if seed is None else seed),
+        per_stratum=np.int64(per_stratum),
+        user_rate=np.float64(user_rate),
+    )
+    return reservoir, users, categories, domains, False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facts", default=FACTS_FILE)
+    parser.add_argument(
+        "--per-stratum",
+        type=int,
+        default=200,
+        help="Rows kept per category x day stratum",
+    )
+    parser.add_argument(
+        "--user-rate",
+        type=float,
+        default=0.05,
+        help="Fraction of users kept for distinct user counts",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--resample", action="store_true", help="Ignore the cached sample"
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.resample and os.path.exists(SAMPLE_CACHE):
+        os.remove(SAMPLE_CACHE)
+    try:
+        reservoir, users, categories, domains, cached = load_sample(
+            args.facts, args.per_stratum, args.user_rate, args.seed
+        )
+    except FileNotFoundError:
+        print(
+            f"Error: The file '{args.facts}' was not found. Please save the results of pipeline/query.sql to this file."
+        )
+        exit()
+    except MissingColumnsError as error:
+        print(f"Error: {error}")
+        exit()
+
+    rows, population, sample_size = reservoir.sample()
+
+    os.makedirs(PREVIEW_DIR, exist_ok=True)
+    datasets = {
+        "q1_rollup_results.csv": q1_rollup(rows, population, sample_size),
+        "question2-data.csv": q2_grouping_sets(
+            rows, population, sample_size, categories
+        ),
+        "question3-data.csv": q3_top_domains(
+            rows, population, sample_size, categories, domains
+        ),
+        "q4_daily_trend.csv": q4_daily_trend(rows, population, sample_size, users),
+    }
+    for filename, df in datasets.items():
+        df.to_csv(f"{PREVIEW_DIR}/{filename}", index=False)
+
+    print(
+        f"{'Reused cached sample of' if cached else 'Sampled'} "
+        f"{len(rows['day']):,} of {population.sum():,} rows "
+        f"({len(population):,} strata) in {time.perf_counter() - started:.1f}s"
+    )
+    print(f"Successfully generated {', '.join(datasets)} in {PREVIEW_DIR}")
+
+
+if __name__ == "__main__":
+    main()
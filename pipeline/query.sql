@@ -0,0 +1,32 @@
+-- ====================================================================================
+-- DIGITAL FACTS EXTRACT (input for the python pipeline)
+-- Run question1/query.sql first so that AOL_SCHEMA.DIGITAL_QUERY_IDS exists.
+-- Save the result as data/digital_facts.csv
+-- ====================================================================================
+SELECT
+    F.ANONID,
+    DQI.QUERY,
+    DQI.CATEGORY,
+    -- Same YYYY-MM-DD key as the Q4 and Q5 daily queries
+    T."year" || '-' ||
+    CASE TRIM(T."month")
+        WHEN 'march' THEN '03'
+        WHEN 'april' THEN '04'
+        WHEN 'may' THEN '05'
+        ELSE 'XX' -- Fallback for error checking
+    END || '-' ||
+    T."day of the month" AS Event_Date_String,
+    T."hour",
+    F.CLICK,
+    F.ITEMRANK, -- Result position that was clicked, NULL when not clicked
+    U.THISDOMAIN -- NULL when the search was not clicked
+FROM
+    AOL_SCHEMA.FACTS F
+JOIN
+    AOL_SCHEMA.TIMEDIM T ON F.TIMEID = T.ID
+JOIN
+    AOL_SCHEMA.DIGITAL_QUERY_IDS DQI ON F.QUERYID = DQI.QUERYID
+LEFT JOIN
+    AOL_SCHEMA.URLDIM U ON F.URLID = U.ID
+WHERE
+    T."year" = '2006';
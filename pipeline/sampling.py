@@ -0,0 +1,191 @@
+from statistics import NormalDist
+
+import numpy as np
+
+# ----------------------------------------------------------------------
+# STRATIFIED RESERVOIR SAMPLING (category x day strata)
+# ----------------------------------------------------------------------
+
+DAY_BITS = 20  # days since 1970 stay well below 2**20
+
+
+def stratum_key(category, day):
+    """Combine category code and day number into one integer key."""
+    return (category.astype(np.int64) << DAY_BITS) | day.astype(np.int64)
+
+
+def lowest_priorities(stratum, priority, size):
+    """Indices of the ``size`` lowest priorities within every stratum."""
+    order = np.lexsort((priority, stratum))
+    sorted_keys = stratum[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    run_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order[np.arange(len(order)) - run_start < size]
+
+
+class StratifiedReservoir:
+    """Uniform sample of at most ``size`` rows per category x day stratum.
+
+    Every row gets a random priority and each stratum keeps the rows
+    with the lowest priorities, which is a reservoir sample that can be
+    merged chunk by chunk. The population size of each stratum is
+    counted exactly so that the sample can be scaled back up.
+    """
+
+    def __init__(self, size, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.strata = np.empty(0, dtype=np.int64)
+        self.population = np.empty(0, dtype=np.int64)
+
+    def update(self, chunk):
+        keys = stratum_key(chunk["category"], chunk["day"])
+
+        # Exact population counts per stratum
+        strata, counts = np.unique(keys, return_counts=True)
+        merged, inverse = np.unique(
+            np.concatenate([self.strata, strata]), return_inverse=True
+        )
+        self.population = np.bincount(
+            inverse, weights=np.concatenate([self.population, counts])
+        ).astype(np.int64)
+        self.strata = merged
+
+        # Keep the lowest priorities of the old sample and the new chunk
+        chunk = dict(chunk, stratum=keys, priority=self.rng.random(len(keys)))
+        if self.rows is not None:
+            chunk = {
+                name: np.concatenate([self.rows[name], chunk[name]]) for name in chunk
+            }
+        keep = lowest_priorities(chunk["stratum"], chunk["priority"], self.size)
+        self.rows = {name: values[keep] for name, values in chunk.items()}
+
+    def shrink(self, size):
+        """Reduce the sample to at most ``size`` rows per stratum.
+
+        The ``size`` lowest priorities of a larger sample are the same rows
+        a reservoir of ``size`` would have kept, so a stored sample can be
+        reused for any smaller size.
+        """
+        keep = lowest_priorities(self.rows["stratum"], self.rows["priority"], size)
+        self.rows = {name: values[keep] for name, values in self.rows.items()}
+        self.size = size
+
+    def sample(self):
+        """Return the sampled rows with their stratum index and sizes.
+
+        ``stratum`` indexes into the returned ``population`` and
+        ``sample_size`` arrays.
+        """
+        stratum = np.searchsorted(self.strata, self.rows["stratum"])
+        sample_size = np.bincount(stratum, minlength=len(self.strata))
+        rows = {k: v for k, v in self.rows.items() if k != "priority"}
+        rows["stratum"] = stratum
+        return rows, self.population, sample_size
+
+
+# ----------------------------------------------------------------------
+# USER SAMPLING (for distinct user counts)
+# ----------------------------------------------------------------------
+
+
+def user_hash(user):
+    """Deterministic uniform [0, 1) value per ANONID (splitmix64)."""
+    z = user.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+class UserSample:
+    """Keep every category x day x user triple for a hashed subset of users.
+
+    A user is either in the sample for all of their searches or for none
+    of them, so distinct user counts scale by ``1 / rate``.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.triples = np.empty((0, 3), dtype=np.int64)
+
+    def update(self, chunk):
+        keep = user_hash(chunk["user"]) < self.rate
+        triples = np.column_stack(
+            [chunk["category"][keep], chunk["day"][keep], chunk["user"][keep]]
+        ).astype(np.int64)
+        self.triples = np.unique(np.concatenate([self.triples, triples]), axis=0)
+
+    def shrink(self, rate):
+        """Reduce the sample to the users a sample at ``rate`` would keep."""
+        self.triples = self.triples[user_hash(self.triples[:, 2]) < rate]
+        self.rate = rate
+
+
+# ----------------------------------------------------------------------
+# ESTIMATORS
+# ----------------------------------------------------------------------
+
+
+def estimate_total(stratum, group, values, n_groups, population, sample_size):
+    """Stratified estimate of a per-group total and its variance.
+
+    Rows with ``group == -1`` are outside every group but still count
+    towards their stratum's sample size.
+    """
+    inside = group >= 0
+    stratum, group, values = stratum[inside], group[inside], values[inside]
+
+    key = stratum.astype(np.int64) * n_groups + group
+    cells, inverse = np.unique(key, return_inverse=True)
+    sums = np.bincount(inverse, weights=values)
+    squares = np.bincount(inverse, weights=values**2)
+    cell_stratum, cell_group = cells // n_groups, cells % n_groups
+
+    N = population[cell_stratum].astype(np.float64)
+    n = sample_size[cell_stratum].astype(np.float64)
+    total = np.bincount(cell_group, weights=sums * N / n, minlength=n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s2 = np.where(n > 1, (squares - sums**2 / n) / (n - 1), 0.0)
+    cell_var = N**2 * (1 - n / N) * s2 / n
+    variance = np.bincount(cell_group, weights=cell_var, minlength=n_groups)
+    return total, variance
+
+
+def estimate_ratio(stratum, group, numerator, n_groups, population, sample_size):
+    """Per-group ratio of ``numerator`` to row count (e.g. CTR) and its variance.
+
+    Uses the linearised (Taylor) variance of a ratio estimator.
+    """
+    ones = np.ones(len(group))
+    num_total, _ = estimate_total(
+        stratum, group, numerator, n_groups, population, sample_size
+    )
+    den_total, _ = estimate_total(
+        stratum, group, ones, n_groups, population, sample_size
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = num_total / den_total
+        safe_group = np.where(group >= 0, group, 0)
+        residual = (numerator - ratio[safe_group]) / den_total[safe_group]
+    _, variance = estimate_total(
+        stratum, group, residual, n_groups, population, sample_size
+    )
+    return ratio, variance
+
+
+def estimate_distinct(group, n_groups, rate):
+    """Scaled distinct count from hashed user sample rows (one per user)."""
+    count = np.bincount(group[group >= 0], minlength=n_groups).astype(np.float64)
+    return count / rate, count * (1 - rate) / rate**2
+
+
+def confidence_interval(estimate, variance, level=0.95, lower=0.0, upper=np.inf):
+    """Normal approximation interval, clipped to the metric's valid range."""
+    half_width = NormalDist().inv_cdf(0.5 + level / 2) * np.sqrt(variance)
+    return (
+        np.clip(estimate - half_width, lower, upper),
+        np.clip(estimate + half_width, lower, upper),
+    )
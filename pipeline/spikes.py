@@ -0,0 +1,166 @@
+"""Spike detection over the daily total, category and query search series.
+
+Run from the repository root:
+
+    python -m pipeline.spikes --window 14 --threshold 4
+
+Writes data/q4_detected_events.csv with one ranked row per candidate
+event day and series. ``python question4/chart-plot.py --detected``
+annotates the top candidates instead of the manual ECOM_EVENTS rows.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pipeline.aggregate import CACHE_FILE, load_aggregates
+from pipeline.facts import FACTS_FILE, MissingColumnsError, day_calendar
+
+MAD_TO_STD = 1.4826  # MAD of a normal distribution times this is its std
+
+
+def robust_z(series, window=14, seasonal=False):
+    """Robust z-score of every day against a trailing baseline.
+
+    ``series`` is a 2-D (series, days) array and all series are scored
+    together. The baseline of day ``t`` is the median and MAD of the
+    ``window`` previous days, or with ``seasonal=True`` of the same
+    weekday in the ``window`` previous weeks. The scale never drops
+    below the Poisson noise ``sqrt(median)`` so that flat, low-volume
+    series do not produce huge scores. Days without a full baseline get
+    NaN.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    lag = 7 if seasonal else 1
+    span = window * lag
+    scores = np.full(series.shape, np.nan)
+    baseline = np.full(series.shape, np.nan)
+    if series.shape[1] <= span:
+        return scores, baseline
+
+    # (series, days - span, window) view of the baseline of each scored day
+    history = sliding_window_view(series[:, :-1], span, axis=1)[:, :, ::lag]
+    median = np.median(history, axis=2)
+    mad = np.median(np.abs(history - median[:, :, None]), axis=2)
+    scale = np.maximum(MAD_TO_STD * mad, np.sqrt(np.maximum(median, 1)))
+
+    scores[:, span:] = (series[:, span:] - median) / scale
+    baseline[:, span:] = median
+    return scores, baseline
+
+
+def rank_candidates(scores, baseline, series, threshold, min_count):
+    """Flatten (series, day) cells above the threshold, best first."""
+    with np.errstate(invalid="ignore"):
+        hits = (scores >= threshold) & (series >= min_count)
+    row, day = np.nonzero(hits)
+    order = np.argsort(-scores[row, day], kind="stable")
+    row, day = row[order], day[order]
+    return row, day, series[row, day], baseline[row, day], scores[row, day]
+
+
+def daily_query_matrix(aggregates, min_count):
+    """Dense (queries, days) counts of the queries that can reach ``min_count``.
+
+    Queries that never have ``min_count`` searches on a single day can
+    not produce a candidate and are left out before densifying.
+    """
+    cells, counts = aggregates["query_cells"], aggregates["query_searches"]
+    peaks = np.zeros(len(aggregates["queries"]), dtype=counts.dtype)
+    np.maximum.at(peaks, cells[:, 1], counts)
+    keep = np.flatnonzero(peaks >= min_count)
+    position = np.full(len(peaks), -1)
+    position[keep] = np.arange(len(keep))
+
+    selected = position[cells[:, 1]] >= 0
+    matrix = np.zeros((len(keep), len(aggregates["days"])))
+    matrix[position[cells[selected, 1]], cells[selected, 0]] = counts[selected]
+    return matrix, aggregates["queries"][keep]
+
+
+def detect(aggregates, window, threshold, min_count, seasonal):
+    daily = aggregates["daily_searches"].T.astype(np.float64)
+    queries, query_labels = daily_query_matrix(aggregates, min_count)
+
+    # One 2-D array holding every series, scored in a single pass
+    series = np.vstack([daily.sum(axis=0, keepdims=True), daily, queries])
+    series_type = np.repeat(
+        ["TOTAL", "CATEGORY", "QUERY"], [1, len(daily), len(queries)]
+    )
+    series_label = np.concatenate(
+        [["TOTAL_DAILY_DIGITAL_SEARCHES"], aggregates["categories"], query_labels]
+    )
+
+    scores, baseline = robust_z(series, window, seasonal)
+    row, day, count, expected, score = rank_candidates(
+        scores, baseline, series, threshold, min_count
+    )
+    return pd.DataFrame(
+        {
+            "EVENT_DATE": day_calendar(aggregates["days"][day])["EVENT_DATE_STRING"],
+            "EVENT_KEYWORD": series_label[row],
+            "SERIES_TYPE": series_type[row],
+            "SEARCH_COUNT": count.astype(np.int64),
+            "BASELINE_COUNT": expected,
+            "ROBUST_Z": score,
+            "SPIKE_RANK": np.arange(1, len(row) + 1),
+        }
+    ), len(series)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facts", default=FACTS_FILE)
+    parser.add_argument("--cache", default=CACHE_FILE)
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=None,
+        help="Baseline days, default 14 (weeks if --seasonal, default 4)",
+    )
+    parser.add_argument("--threshold", type=float, default=4.0, help="Min robust z")
+    parser.add_argument("--min-count", type=int, default=20, help="Min daily searches")
+    parser.add_argument(
+        "--seasonal",
+        action="store_true",
+        help="Compare each day with the same weekday of previous weeks",
+    )
+    args = parser.parse_args()
+
+    try:
+        aggregates = load_aggregates(args.facts, args.cache)
+    except FileNotFoundError:
+        print(
+            f"Error: The file '{args.facts}' was not found. Please save the results of pipeline/query.sql to this file."
+        )
+        exit()
+    except MissingColumnsError as error:
+        print(f"Error: {error}")
+        exit()
+
+    # 92 days of data leave no room for a 14 week seasonal baseline
+    if args.window is None:
+        args.window = 4 if args.seasonal else 14
+    span = args.window * (7 if args.seasonal else 1)
+    if span >= len(aggregates["days"]):
+        parser.error(
+            f"--window {args.window} needs more than {span} days of data, "
+            f"the extract has {len(aggregates['days'])}"
+        )
+
+    started = time.perf_counter()
+    df, n_series = detect(
+        aggregates, args.window, args.threshold, args.min_count, args.seasonal
+    )
+    elapsed = time.perf_counter() - started
+    df.to_csv("./data/q4_detected_events.csv", index=False)
+
+    print(f"Scored {n_series:,} series in {elapsed:.3f}s, {len(df):,} candidate days")
+    print("Successfully generated q4_detected_events.csv")
+
+
+if __name__ == "__main__":
+    main()
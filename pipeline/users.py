@@ -0,0 +1,148 @@
+"""Exact distinct user counts from the cached ANONID bitmaps.
+
+Run from the repository root, for example:
+
+    python -m pipeline.users union --days 2006-03-14 2006-03-29 2006-04-10
+    python -m pipeline.users intersection --categories Media/Music Brand/Reading
+    python -m pipeline.users difference --categories Media/Music Brand/Reading
+    python -m pipeline.users then --categories Media/Music Brand/Reading
+
+With several ``--categories`` every category is one operand (restricted
+to ``--days`` if given), otherwise every day is one operand (restricted
+to ``--categories`` if given). ``then`` counts the users who searched the
+first category on an earlier day than the second one (both on one of
+``--days`` if given).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from pipeline.aggregate import CACHE_FILE, load_aggregates
+from pipeline.bitmaps import RoaringBitmap, load_bitmap
+from pipeline.facts import FACTS_FILE, MissingColumnsError, day_calendar
+
+
+class UserBitmaps:
+    """ANONID bitmaps per category x day from the aggregate cache."""
+
+    def __init__(self, aggregates):
+        self.categories = list(aggregates["categories"])
+        self.dates = list(day_calendar(aggregates["days"])["EVENT_DATE_STRING"])
+        self.store = {
+            name[len("users_") :]: array
+            for name, array in aggregates.items()
+            if name.startswith("users_")
+        }
+
+    def users(self, category, date):
+        """Users who searched ``category`` on ``date``."""
+        index = self.categories.index(category) * len(self.dates)
+        return load_bitmap(self.store, index + self.dates.index(date))
+
+    def select(self, categories=None, dates=None):
+        """Users who searched any of ``categories`` on any of ``dates``."""
+        return RoaringBitmap.union(
+            self.users(category, date)
+            for category in categories or self.categories
+            for date in dates or self.dates
+        )
+
+    def then(self, first, second, dates=None):
+        """Users who searched ``first`` on an earlier day than ``second``.
+
+        With ``dates`` both searches have to be on one of those days.
+        """
+        users, first_day = self._search_day(first, dates)
+        later_users, last_day = self._search_day(second, dates, last=True)
+        both, i, j = np.intersect1d(
+            users, later_users, assume_unique=True, return_indices=True
+        )
+        return RoaringBitmap.from_ids(both[first_day[i] < last_day[j]])
+
+    def _search_day(self, category, dates=None, last=False):
+        """Every user of ``category`` with their first (or last) day index."""
+        # Day indices in chronological order, whatever order ``dates`` is in
+        days = sorted(self.dates.index(date) for date in set(dates or self.dates))
+        ids = [self.users(category, self.dates[day]).to_array() for day in days]
+        day = np.repeat(days, [len(part) for part in ids])
+        ids = np.concatenate(ids)
+        if last:
+            ids, day = ids[::-1], day[::-1]
+        users, index = np.unique(ids, return_index=True)
+        return users, day[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[2:]),
+    )
+    parser.add_argument(
+        "operation", choices=["union", "intersection", "difference", "then"]
+    )
+    parser.add_argument("--categories", nargs="*", default=[])
+    parser.add_argument("--days", nargs="*", default=[], help="YYYY-MM-DD")
+    parser.add_argument("--facts", default=FACTS_FILE)
+    parser.add_argument("--cache", default=CACHE_FILE)
+    args = parser.parse_args()
+
+    try:
+        bitmaps = UserBitmaps(load_aggregates(args.facts, args.cache))
+    except FileNotFoundError:
+        print(
+            f"Error: The file '{args.facts}' was not found. Please save the results of pipeline/query.sql to this file."
+        )
+        exit()
+    except MissingColumnsError as error:
+        print(f"Error: {error}")
+        exit()
+
+    unknown = [c for c in args.categories if c not in bitmaps.categories]
+    if unknown:
+        parser.error(
+            f"unknown --categories {', '.join(unknown)} "
+            f"(choose from {', '.join(sorted(bitmaps.categories))})"
+        )
+    unknown = [d for d in args.days if d not in bitmaps.dates]
+    if unknown:
+        parser.error(
+            f"unknown --days {', '.join(unknown)} (use YYYY-MM-DD from "
+            f"{bitmaps.dates[0]} to {bitmaps.dates[-1]})"
+        )
+
+    started = time.perf_counter()
+    if args.operation == "then":
+        if len(args.categories) != 2:
+            parser.error("then needs exactly two --categories")
+        result = bitmaps.then(*args.categories, args.days)
+        operands = []
+    else:
+        if len(args.categories) > 1:
+            operands = [
+                bitmaps.select([category], args.days) for category in args.categories
+            ]
+        else:
+            operands = [
+                bitmaps.select(args.categories, [date])
+                for date in args.days or bitmaps.dates
+            ]
+        if args.operation == "union":
+            result = RoaringBitmap.union(operands)
+        elif args.operation == "intersection":
+            result = RoaringBitmap.intersection(operands)
+        else:
+            result = operands[0] - RoaringBitmap.union(operands[1:])
+    elapsed = time.perf_counter() - started
+
+    for name, operand in zip(
+        args.categories if len(args.categories) > 1 else args.days, operands
+    ):
+        print(f"{name}: {len(operand):,} users")
+    print(f"{args.operation}: {len(result):,} users ({elapsed * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
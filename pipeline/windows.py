@@ -0,0 +1,231 @@
+"""Streaming window metrics over the per-category search series.
+
+Run from the repository root:
+
+    python -m pipeline.windows --width 7 --alpha 0.3
+
+Writes data/category_daily_windows.csv (cumulative, rolling, EWMA and
+week-over-week metrics per category and day) and
+data/q1_period_over_period.csv (week-over-week deltas over whole ISO
+weeks and month-over-month deltas of the Q1 search counts). ``--hourly`` also writes
+data/category_hourly_windows.csv.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from pipeline.aggregate import CACHE_FILE, load_aggregates
+from pipeline.facts import FACTS_FILE, MissingColumnsError, day_calendar
+
+
+class StreamingWindows:
+    """Window metrics for many series at once, updated one point at a time.
+
+    Every call to ``update`` takes the newest value of each series (a
+    1-D array) and costs O(1) per series: running sums for the
+    cumulative metrics, a ring buffer of ``width`` points for the
+    rolling sum and mean, and a ring buffer of ``lag`` points for the
+    period-over-period delta.
+    """
+
+    def __init__(self, n_series, width=7, alpha=0.3, lag=7):
+        self.width = width
+        self.alpha = alpha
+        self.lag = lag
+        self.count = 0
+        self.cumulative_sum = np.zeros(n_series)
+        self.rolling_sum = np.zeros(n_series)
+        self.ewma = np.zeros(n_series)
+        self.window = np.zeros((width, n_series))
+        self.history = np.full((lag, n_series), np.nan)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        slot = self.count % self.width
+        self.rolling_sum += values - self.window[slot]
+        self.window[slot] = values
+
+        lag_slot = self.count % self.lag
+        previous = self.history[lag_slot].copy()
+        self.history[lag_slot] = values
+
+        self.cumulative_sum += values
+        if self.count == 0:
+            self.ewma = values
+        else:
+            self.ewma = self.alpha * values + (1 - self.alpha) * self.ewma
+        self.count += 1
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct_change = (values - previous) * 100 / previous
+        return {
+            "CUMULATIVE_SUM": self.cumulative_sum.copy(),
+            "CUMULATIVE_AVG": self.cumulative_sum / self.count,
+            "ROLLING_SUM": self.rolling_sum.copy(),
+            "ROLLING_AVG": self.rolling_sum / min(self.count, self.width),
+            "EWMA": self.ewma.copy(),
+            "PREVIOUS_PERIOD": previous,
+            "DELTA": values - previous,
+            "DELTA_PERCENTAGE": pct_change,
+        }
+
+    def run(self, matrix):
+        """Feed a (periods, series) matrix row by row and stack the results."""
+        steps = [self.update(row) for row in matrix]
+        return {name: np.stack([step[name] for step in steps]) for name in steps[0]}
+
+
+def with_total(matrix, categories):
+    """Append an all-categories column (labelled '' like a ROLLUP total)."""
+    return np.column_stack([matrix, matrix.sum(axis=1)]), list(categories) + [""]
+
+
+def to_long(index, series, metrics, values):
+    """Flatten (periods, series) metric matrices into one row per cell."""
+    df = index.loc[index.index.repeat(len(series))].reset_index(drop=True)
+    df["CATEGORY"] = np.tile(series, len(index))
+    df["TOTAL_SEARCHES"] = values.ravel()
+    for name, matrix in metrics.items():
+        df[name] = matrix.ravel()
+    return df
+
+
+def daily_windows(aggregates, width, alpha):
+    values, series = with_total(aggregates["daily_searches"], aggregates["categories"])
+    metrics = StreamingWindows(len(series), width, alpha, lag=7).run(values)
+    metrics = {
+        "CUMULATIVE_SEARCH_AVG": metrics["CUMULATIVE_AVG"],
+        f"ROLLING_{width}D_SUM": metrics["ROLLING_SUM"],
+        f"ROLLING_{width}D_AVG": metrics["ROLLING_AVG"],
+        "EWMA": metrics["EWMA"],
+        "WOW_DELTA": metrics["DELTA"],
+        "WOW_DELTA_PERCENTAGE": metrics["DELTA_PERCENTAGE"],
+    }
+    index = day_calendar(aggregates["days"])[["EVENT_DATE_STRING"]]
+    return to_long(index, series, metrics, values)
+
+
+def hourly_windows(aggregates, alpha):
+    values, series = with_total(aggregates["hourly_searches"], aggregates["categories"])
+    metrics = StreamingWindows(len(series), width=24, alpha=alpha, lag=24).run(values)
+    metrics = {
+        "ROLLING_24H_SUM": metrics["ROLLING_SUM"],
+        "ROLLING_24H_AVG": metrics["ROLLING_AVG"],
+        "EWMA": metrics["EWMA"],
+        "DOD_DELTA": metrics["DELTA"],
+    }
+    hours = len(values)
+    calendar = day_calendar(np.repeat(aggregates["days"], 24))
+    index = pd.DataFrame(
+        {
+            "EVENT_DATE_STRING": calendar["EVENT_DATE_STRING"],
+            "hour": [f"{h:02d}" for h in np.arange(hours) % 24],
+        }
+    )
+    return to_long(index, series, metrics, values)
+
+
+def q1_period_over_period(aggregates):
+    """WoW and MoM deltas of the Q1 search counts.
+
+    The Q1 ROLLUP(month, calender week) splits a week that spans two
+    months into two partial weeks, so the WoW periods are whole ISO
+    weeks (Monday to Sunday, ``SALES_MONTH`` left empty) instead. A
+    delta is only given when both periods are fully covered by the
+    extract, ``PERIOD_DAYS`` holds the days of data in each period.
+    """
+    calendar = day_calendar(aggregates["days"])
+    dates = pd.to_datetime(calendar["EVENT_DATE_STRING"])
+    values, series = with_total(aggregates["daily_searches"], aggregates["categories"])
+
+    # Period of every day in chronological order (days are consecutive)
+    week_start = aggregates["days"] - calendar["weekday"].to_numpy()
+    periods = {
+        "WOW": (week_start - week_start[0]) // 7,
+        "MOM": calendar.groupby("SALES_MONTH", sort=False).ngroup().to_numpy(),
+    }
+
+    frames = []
+    for label, period in periods.items():
+        matrix = np.zeros((period.max() + 1, len(series)), dtype=np.int64)
+        np.add.at(matrix, period, values)
+        metrics = StreamingWindows(len(series), width=1, lag=1).run(matrix)
+
+        first = np.unique(period, return_index=True)[1]
+        period_days = np.bincount(period)
+        if label == "WOW":
+            complete = period_days == 7
+            index = pd.DataFrame(
+                {
+                    "SALES_MONTH": "",
+                    "calender week": calendar["calender week"]
+                    .iloc[first]
+                    .map("{:02d}".format)
+                    .to_numpy(),
+                }
+            )
+        else:
+            complete = period_days == dates.dt.days_in_month.iloc[first].to_numpy()
+            index = pd.DataFrame(
+                {
+                    "SALES_MONTH": calendar["SALES_MONTH"].iloc[first].to_numpy(),
+                    "calender week": "",
+                }
+            )
+        index["PERIOD_DAYS"] = period_days
+
+        # Compare only whole periods with whole periods
+        comparable = complete & np.r_[False, complete[:-1]]
+        df = to_long(
+            index,
+            series,
+            {
+                f"{label}_DELTA": np.where(
+                    comparable[:, None], metrics["DELTA"], np.nan
+                ),
+                f"{label}_DELTA_PERCENTAGE": np.where(
+                    comparable[:, None], metrics["DELTA_PERCENTAGE"], np.nan
+                ),
+            },
+            matrix,
+        )
+        frames.append(df.rename(columns={"TOTAL_SEARCHES": "DIGITAL_SEARCH_COUNT"}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--facts", default=FACTS_FILE)
+    parser.add_argument("--cache", default=CACHE_FILE)
+    parser.add_argument("--width", type=int, default=7, help="Rolling window in days")
+    parser.add_argument("--alpha", type=float, default=0.3, help="EWMA smoothing")
+    parser.add_argument("--hourly", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        aggregates = load_aggregates(args.facts, args.cache)
+    except FileNotFoundError:
+        print(
+            f"Error: The file '{args.facts}' was not found. Please save the results of pipeline/query.sql to this file."
+        )
+        exit()
+    except MissingColumnsError as error:
+        print(f"Error: {error}")
+        exit()
+
+    outputs = {
+        "category_daily_windows.csv": daily_windows(aggregates, args.width, args.alpha),
+        "q1_period_over_period.csv": q1_period_over_period(aggregates),
+    }
+    if args.hourly:
+        outputs["category_hourly_windows.csv"] = hourly_windows(aggregates, args.alpha)
+    for filename, df in outputs.items():
+        df.to_csv(f"./data/{filename}", index=False)
+
+    print(f"Successfully generated {', '.join(outputs)}")
+
+
+if __name__ == "__main__":
+    main()
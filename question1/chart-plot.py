@@ -2,6 +2,12 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
+
+# Pass --preview to plot the sampled estimates written by pipeline/preview.py
+PREVIEW = "--preview" in sys.argv
+DATA_DIR = "./data/preview" if PREVIEW else "./data"
+SUFFIX = "_preview" if PREVIEW else ""
 
 # Define the colors
 DARK_TEAL = "#008080"
@@ -14,7 +20,7 @@ sns.set_theme(style="whitegrid")
 # ----------------------------------------------------------------------
 
 try:
-    df = pd.read_csv("./data/q1_rollup_results.csv")
+    df = pd.read_csv(f"{DATA_DIR}/q1_rollup_results.csv")
 except FileNotFoundError:
     print(
         "Error: The file 'q1_rollup_results.csv' was not found. Please ensure your query results are saved to this file."
@@ -102,7 +108,7 @@ ax.grid(axis="x", linestyle="--", alpha=0.7)
 ax.legend(loc="upper right")
 
 plt.tight_layout()
-plt.savefig("question1/q1_monthly_bar_volume.png", bbox_inches="tight")
+plt.savefig(f"question1/q1_monthly_bar_volume{SUFFIX}.png", bbox_inches="tight")
 plt.close()
 
 
@@ -127,7 +133,9 @@ plt.xticks(rotation=45, ha="right", fontsize=9)
 plt.grid(axis="y", linestyle="--", alpha=0.7)
 
 plt.tight_layout()
-plt.savefig("question1/q1_weekly_line_trend.png", bbox_inches="tight")
+plt.savefig(f"question1/q1_weekly_line_trend{SUFFIX}.png", bbox_inches="tight")
 plt.close()
 
-print("Successfully generated q1_monthly_bar_volume.png and q1_weekly_line_trend.png")
+print(
+    f"Successfully generated q1_monthly_bar_volume{SUFFIX}.png and q1_weekly_line_trend{SUFFIX}.png"
+)
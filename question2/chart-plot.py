@@ -2,13 +2,19 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
+import sys
+
+# Pass --preview to plot the sampled estimates written by pipeline/preview.py
+PREVIEW = "--preview" in sys.argv
+DATA_DIR = "./data/preview" if PREVIEW else "./data"
+SUFFIX = "_preview" if PREVIEW else ""
 
 # Set figure aesthetics
 sns.set_theme(style="whitegrid")
 
 # Load the data from the CSV file
 try:
-    df = pd.read_csv("./data/question2-data.csv")
+    df = pd.read_csv(f"{DATA_DIR}/question2-data.csv")
 except FileNotFoundError:
     print(
         "Error: The file 'question2-data.csv' was not found. Please ensure your query results are saved to this file."
@@ -44,12 +50,26 @@ sns.barplot(
     hue="CATEGORY",
     palette="dark:#32B8B8",
 )
+if PREVIEW:
+    plt.errorbar(
+        df_overall_ctr["CTR_PERCENTAGE"],
+        np.arange(len(df_overall_ctr)),
+        xerr=[
+            df_overall_ctr["CTR_PERCENTAGE"] - df_overall_ctr["CTR_PERCENTAGE_CI_LOW"],
+            df_overall_ctr["CTR_PERCENTAGE_CI_HIGH"] - df_overall_ctr["CTR_PERCENTAGE"],
+        ],
+        fmt="none",
+        ecolor="black",
+        capsize=4,
+        label="95% Confidence Interval",
+    )
+    plt.legend(loc="lower right")
 plt.title("Overall User Intent (CTR) by Digital Commerce Category", fontsize=16)
 plt.xlabel("Click-Through Rate (%)")
 plt.ylabel("Digital Commerce Category")
 plt.xticks(rotation=0)
 plt.gca().xaxis.grid(True)  # Ensure horizontal grid lines are visible for comparison
-plt.savefig("question2/q2_bar_category_ctr.png", bbox_inches="tight")
+plt.savefig(f"question2/q2_bar_category_ctr{SUFFIX}.png", bbox_inches="tight")
 plt.close()
 
 # ----------------------------------------------------------------------
@@ -80,7 +100,7 @@ plt.title("Peak Digital Commerce User Intent (CTR) by Category and Hour", fontsi
 plt.ylabel("Digital Commerce Category")
 plt.xlabel("Hour of Day (00 - 23)")
 plt.yticks(rotation=0)
-plt.savefig("question2/q2_heatmap_hour_ctr.png", bbox_inches="tight")
+plt.savefig(f"question2/q2_heatmap_hour_ctr{SUFFIX}.png", bbox_inches="tight")
 plt.close()
 
 # ----------------------------------------------------------------------
@@ -123,9 +143,51 @@ plt.xlabel("Day of the Week")
 plt.ylabel("Total Searches (Count)")
 plt.xticks(rotation=45, ha="right")
 plt.legend(title="Category", loc="upper left")
-plt.savefig("question2/q2_bar_weekday_volume.png", bbox_inches="tight")
+plt.savefig(f"question2/q2_bar_weekday_volume{SUFFIX}.png", bbox_inches="tight")
 plt.close()
 
 print(
-    "Successfully generated q2_bar_category_ctr.png, q2_heatmap_hour_ctr.png and q2_bar_weekday_volume.png"
+    f"Successfully generated q2_bar_category_ctr{SUFFIX}.png, q2_heatmap_hour_ctr{SUFFIX}.png and q2_bar_weekday_volume{SUFFIX}.png"
 )
+
+# ----------------------------------------------------------------------
+# CHART 4: HEATMAP (Category vs. Category Lift)
+# ----------------------------------------------------------------------
+
+# Written by pipeline/affinity.py from the full export, so it is not part of
+# the preview and is skipped when pipeline/affinity.py has not been run
+if PREVIEW:
+    exit()
+try:
+    df_affinity = pd.read_csv("./data/q2_category_affinity.csv")
+except FileNotFoundError:
+    print(
+        "Skipping q2_heatmap_category_lift.png: run python -m pipeline.affinity to create q2_category_affinity.csv."
+    )
+    exit()
+
+lift_data = df_affinity.pivot(index="CATEGORY_A", columns="CATEGORY_B", values="LIFT")
+
+plt.figure(figsize=(11, 9))
+sns.heatmap(
+    lift_data,
+    # The diagonal is a category with itself, not an affinity
+    mask=np.eye(len(lift_data), dtype=bool),
+    cmap="vlag",
+    center=1,
+    annot=True,
+    fmt=".2f",
+    linewidths=0.5,
+    cbar_kws={"label": "Lift (1 = no affinity)"},
+)
+plt.title(
+    "Cross-Category Affinity: Lift of Users Searching Both Categories", fontsize=16
+)
+plt.ylabel("Digital Commerce Category")
+plt.xlabel("Digital Commerce Category")
+plt.xticks(rotation=45, ha="right")
+plt.yticks(rotation=0)
+plt.savefig("question2/q2_heatmap_category_lift.png", bbox_inches="tight")
+plt.close()
+
+print("Successfully generated q2_heatmap_category_lift.png")
@@ -0,0 +1,55 @@
+import pandas as pd
+import seaborn as sns
+import matplotlib.pyplot as plt
+import numpy as np
+
+# Set figure aesthetics
+sns.set_theme(style="whitegrid")
+
+# Load the data written by pipeline/click_position.py
+try:
+    df = pd.read_csv("./data/q2_click_position.csv", dtype={"ITEM_RANK": str})
+except FileNotFoundError:
+    print(
+        "Error: The file 'q2_click_position.csv' was not found. Please run python -m pipeline.click_position first."
+    )
+    exit()
+
+# Clean up column names and the empty hour/weekday of the grouping sets
+df.columns = df.columns.str.strip()
+df["CATEGORY"] = df["CATEGORY"].str.strip()
+df = df.replace("", np.nan)
+
+# ----------------------------------------------------------------------
+# CHART: CTR BY CLICKED RESULT POSITION (Line Chart per Category)
+# ----------------------------------------------------------------------
+
+# Filter data for the (CATEGORY) grouping set: where both hour and weekday are NULL/NaN
+df_category = df[df["hour"].isna() & df["weekday"].isna()].copy()
+# Clicks without a recorded position have no place on the position axis
+df_category = df_category[df_category["ITEM_RANK"] != "unknown"]
+
+# Keep the result positions in rank order (1, 2, ..., "11+")
+rank_order = list(dict.fromkeys(df_category["ITEM_RANK"]))
+df_category["ITEM_RANK"] = pd.Categorical(
+    df_category["ITEM_RANK"], categories=rank_order, ordered=True
+)
+
+plt.figure(figsize=(12, 7))
+sns.lineplot(
+    data=df_category,
+    x="ITEM_RANK",
+    y="CTR_PERCENTAGE",
+    hue="CATEGORY",
+    marker="o",
+    palette="Spectral",
+)
+plt.yscale("log")
+plt.title("Click-Through Rate by Clicked Result Position (ItemRank)", fontsize=16)
+plt.xlabel("Clicked Result Position")
+plt.ylabel("CTR at Position (%, log scale)")
+plt.legend(title="Category", loc="upper right")
+plt.savefig("question2/q2_line_click_position_ctr.png", bbox_inches="tight")
+plt.close()
+
+print("Successfully generated q2_line_click_position_ctr.png")
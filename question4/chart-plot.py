@@ -2,6 +2,19 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib.dates as mdates
+import sys
+
+# Pass --preview to plot the sampled estimates written by pipeline/preview.py
+PREVIEW = "--preview" in sys.argv
+DATA_DIR = "./data/preview" if PREVIEW else "./data"
+SUFFIX = "_preview" if PREVIEW else ""
+
+# Pass --detected to annotate the top spikes found by pipeline/spikes.py
+# instead of the manually inserted ECOM_EVENTS rows
+DETECTED = "--detected" in sys.argv
+DETECTED_EVENTS = 10  # Number of spike days to annotate
+if DETECTED:
+    SUFFIX += "_detected"
 
 # Define the colors
 DARK_TEAL = "#097157"
@@ -17,15 +30,23 @@ sns.set_theme(style="whitegrid")
 
 try:
     # Load the overall daily search trend (Context)
-    df_trend = pd.read_csv("./data/q4_daily_trend.csv")
-    # Load the event day search volumes (Stimulus/Response)
-    df_events = pd.read_csv("./data/q4_event_response.csv")
+    df_trend = pd.read_csv(f"{DATA_DIR}/q4_daily_trend.csv")
+    # Load the event day search volumes (Stimulus/Response), not part of the preview
+    if DETECTED:
+        df_events = pd.read_csv("./data/q4_detected_events.csv")
+    else:
+        df_events = pd.read_csv("./data/q4_event_response.csv")
 except FileNotFoundError:
     print(
-        "Error: Required files (q4_daily_trend.csv and/or q4_event_response.csv) not found."
+        "Error: Required files (q4_daily_trend.csv and/or q4_event_response.csv or q4_detected_events.csv) not found."
     )
     exit()
 
+if DETECTED:
+    # Candidates are ranked best first, keep the strongest spike of each day
+    df_events = df_events.drop_duplicates("EVENT_DATE").head(DETECTED_EVENTS)
+    df_events["HIGH_INTENT_SEARCH_COUNT"] = df_events["SEARCH_COUNT"]
+
 # Clean and convert date columns
 df_trend.columns = df_trend.columns.str.strip()
 df_events.columns = df_events.columns.str.strip()
@@ -77,6 +98,15 @@ sns.lineplot(
     linewidth=1.5,
     label="Unique Daily Digital Users",
 )
+if PREVIEW:
+    ax2.fill_between(
+        df_merged["EVENT_DATE_STRING"],
+        df_merged["UNIQUE_DAILY_DIGITAL_USERS_CI_LOW"],
+        df_merged["UNIQUE_DAILY_DIGITAL_USERS_CI_HIGH"],
+        color=ACCENT_BLUE,
+        alpha=0.15,
+        label="95% Confidence Interval",
+    )
 ax2.set_ylabel("Unique Daily Digital Users (Count)", color=ACCENT_BLUE, fontsize=12)
 ax2.tick_params(axis="y", labelcolor=ACCENT_BLUE)
 
@@ -127,7 +157,7 @@ lines_2, labels_2 = ax2.get_legend_handles_labels()
 ax1.legend(lines_1 + lines_2, labels_1 + labels_2, loc="lower right", fontsize=10)
 
 plt.tight_layout()
-plt.savefig("question4/q4_annotated_timeseries.png", bbox_inches="tight")
+plt.savefig(f"question4/q4_annotated_timeseries{SUFFIX}.png", bbox_inches="tight")
 plt.close()
 
-print("Successfully generated q4_annotated_timeseries.png")
+print(f"Successfully generated q4_annotated_timeseries{SUFFIX}.png")